@@ -1,8 +1,32 @@
+import abc
+import asyncio
+import contextlib
+import csv
+import functools
+import gzip
+import io
+import os
+import shelve
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from xml.etree import ElementTree
 import pandas as pd
 import folium
+import requests
+from geopy.adapters import AioHTTPAdapter, RequestsAdapter
+from geopy.extra.rate_limiter import AsyncRateLimiter, RateLimiter
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
-import time
+
+# On-disk cache of reverse geocoded addresses, kept between runs
+GEOCODE_CACHE_FILE = 'geocode_cache.db'
+
+# Nominatim allows one request per second; the rate limiters also retry failed requests after a short wait,
+# counting the time already spent on the previous request towards the delay instead of sleeping a fixed amount
+RATE_LIMIT = {'min_delay_seconds': 1.0, 'max_retries': 3, 'error_wait_seconds': 2.0}
+
+# Environment variable holding the HERE API key; without it only Nominatim is used
+HERE_API_KEY_ENV = 'HERE_API_KEY'
 
 def create_map():
     """
@@ -11,50 +35,266 @@ def create_map():
     """
     return folium.Map(location=[0, 0], zoom_start=2)  # Set initial location and zoom level
 
-def add_marker_to_map(map_obj, lat, lon, address):
+def save_map(map_obj, output_file):
+    """
+    Save the map to output_file and a gzip-compressed copy to output_file + '.gz'.
+    The page is rendered once and the same HTML is written to both files.
+    """
+    html = map_obj.get_root().render()
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(html)
+    with gzip.open(output_file + '.gz', 'wt', encoding='utf-8') as f:
+        f.write(html)
+
+def add_marker_to_map(feature_group, lat, lon, address):
     """
-    Add a marker to the provided map object at the specified latitude and longitude.
+    Add a marker to the provided feature group at the specified latitude and longitude.
     The marker will display a popup with the address when clicked.
     
     Parameters:
-    - map_obj: The folium map object to which the marker will be added.
+    - feature_group: The folium feature group to which the marker will be added.
     - lat: Latitude of the marker.
     - lon: Longitude of the marker.
     - address: Address text to be displayed in the popup.
     """
-    folium.Marker(
+    feature_group.add_child(folium.Marker(
         location=[lat, lon],
         popup=folium.Popup(f"Address: {address}", max_width=300)
-    ).add_to(map_obj)
+    ))
 
-def reverse_geocode_with_retry(geolocator, coordinates, retries=3, timeout=10):
+def geocode_cache_key(lat, lon):
     """
-    Reverse geocode a set of coordinates with retry logic in case of timeouts or service unavailability.
+    Build the address cache key for a coordinate pair, rounded to 4 decimal places (about 11 m).
+    """
+    return f"{round(lat, 4)},{round(lon, 4)}"
+
+async def reverse_geocode_cached(reverse, coordinates, cache, timeout=10):
+    """
+    Reverse geocode a set of coordinates with a single rate-limited geocoder call, unless cached.
+    Addresses are cached by coordinates rounded to 4 decimal places (about 11 m), so nearby
+    points and repeated runs skip the geocoding service.
     
     Parameters:
-    - geolocator: The geopy geolocator instance.
+    - reverse: A rate-limited coroutine function wrapping the geolocator's reverse method.
     - coordinates: A tuple (latitude, longitude) to reverse geocode.
-    - retries: Number of times to retry the request in case of a timeout.
+    - cache: A shelve mapping of rounded coordinates to addresses.
     - timeout: Time in seconds to wait for the geocoding service response.
     
     Returns:
-    - Location object if successful, or None if all retries fail.
+    - Address string if successful, or None if the rate limiter gave up.
+    """
+    key = geocode_cache_key(*coordinates)
+    if key in cache:
+        return cache[key]
+    
+    location = await reverse(coordinates, timeout=timeout)
+    if location is None:
+        return None
+    
+    # Store only the address string, Location objects are not cheap to pickle
+    cache[key] = location.address
+    return location.address
+
+class BulkReverseGeocoder(abc.ABC):
     """
-    for attempt in range(retries):
+    Base class for providers that reverse geocode many coordinates in a single batch job,
+    instead of one request per coordinate pair.
+    """
+    
+    @abc.abstractmethod
+    def bulk_reverse(self, coordinates):
+        """
+        Reverse geocode a list of coordinates.
+        
+        Parameters:
+        - coordinates: A list of (latitude, longitude) tuples.
+        
+        Returns:
+        - List of address strings in the same order, with None where no address was found.
+        """
+
+class HereBatchReverse(BulkReverseGeocoder):
+    """
+    Reverse geocode coordinates with the HERE Batch Geocoder API.
+    Each job uploads up to max_job_size coordinates, is polled until it completes,
+    and its result file is downloaded and matched back to the input by record id.
+    """
+    
+    JOBS_URL = 'https://batch.geocoder.ls.hereapi.com/6.2/jobs'
+    
+    def __init__(self, api_key, max_job_size=10000, radius=100, poll_interval=5, max_wait=600, timeout=30):
+        """
+        Parameters:
+        - api_key: HERE API key.
+        - max_job_size: Maximum number of coordinates uploaded in one job.
+        - radius: Search radius in meters around each coordinate pair.
+        - poll_interval: Time in seconds between job status checks.
+        - max_wait: Time in seconds to wait for a job to complete before giving up.
+        - timeout: Time in seconds to wait for each HTTP response.
+        """
+        self.api_key = api_key
+        self.max_job_size = max_job_size
+        self.radius = radius
+        self.poll_interval = poll_interval
+        self.max_wait = max_wait
+        self.timeout = timeout
+        self.session = requests.Session()  # Reuse one connection for submitting, polling and downloading
+    
+    def bulk_reverse(self, coordinates):
+        addresses = []
+        for start in range(0, len(coordinates), self.max_job_size):
+            addresses.extend(self._run_job(coordinates[start:start + self.max_job_size]))
+        return addresses
+    
+    def _run_job(self, coordinates):
+        # Upload the coordinates as a pipe-delimited file with one record per coordinate pair
+        lines = ['recId|prox'] + [f"{rec_id}|{lat},{lon},{self.radius}" for rec_id, (lat, lon) in enumerate(coordinates)]
+        response = self.session.post(
+            self.JOBS_URL,
+            params={
+                'apiKey': self.api_key,
+                'action': 'run',
+                'mode': 'retrieveAddresses',
+                'header': 'true',
+                'inDelim': '|',
+                'outDelim': '|',
+                'outCols': 'locationLabel',
+                'outputcombined': 'true'
+            },
+            data='\n'.join(lines).encode('utf-8'),
+            headers={'Content-Type': 'text/plain'},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        job_id = _find_xml_text(response.content, 'RequestId')
+        
+        # Wait for the job to finish
+        deadline = time.monotonic() + self.max_wait
+        while True:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"HERE batch job {job_id} did not complete within {self.max_wait} seconds")
+            time.sleep(self.poll_interval)
+            response = self.session.get(
+                f"{self.JOBS_URL}/{job_id}",
+                params={'apiKey': self.api_key, 'action': 'status'},
+                timeout=self.timeout
+            )
+            response.raise_for_status()
+            status = _find_xml_text(response.content, 'Status')
+            if status == 'completed':
+                break
+            if status in ('failed', 'cancelled', 'deleted'):
+                raise RuntimeError(f"HERE batch job {job_id} {status}")
+        
+        # Download the result, which is usually delivered as a zip archive holding one file
+        response = self.session.get(
+            f"{self.JOBS_URL}/{job_id}/result",
+            params={'apiKey': self.api_key},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
         try:
-            location = geolocator.reverse(coordinates, timeout=timeout)
-            return location
-        except GeocoderTimedOut:
-            # If a timeout occurs, retry after an exponential backoff delay
-            print(f"Geocoding service timed out on attempt {attempt + 1}. Retrying...")
-            time.sleep(2 ** attempt)  # Exponential backoff
-        except GeocoderUnavailable as e:
-            # If the service is unavailable, print the error and stop retrying
-            print(f"Geocoding service is unavailable: {e}")
-            break  # Stop retrying if the service is unavailable
-    return None
-
-def process_csv(file_path, batch_size=100):
+            content = response.content
+            if zipfile.is_zipfile(io.BytesIO(content)):
+                with zipfile.ZipFile(io.BytesIO(content)) as archive:
+                    content = archive.read(archive.namelist()[0])
+            
+            # Keep the first (best) match for every record
+            addresses = [None] * len(coordinates)
+            for row in csv.DictReader(io.StringIO(content.decode('utf-8')), delimiter='|'):
+                rec_id = int(row['recId'])
+                if rec_id < 0:
+                    raise IndexError(f"negative record id {rec_id}")
+                if addresses[rec_id] is None and row.get('locationLabel'):
+                    addresses[rec_id] = row['locationLabel']
+        except (zipfile.BadZipFile, UnicodeDecodeError, csv.Error, KeyError, ValueError, IndexError) as e:
+            # Report a malformed result file like any other job failure, so the caller can fall back
+            raise RuntimeError(f"Unreadable result for HERE batch job {job_id}: {e!r}") from e
+        return addresses
+
+def _find_xml_text(content, tag):
+    """
+    Return the text of the first element with the given tag in an XML document, ignoring namespaces.
+    """
+    try:
+        root = ElementTree.fromstring(content)
+    except ElementTree.ParseError as e:
+        raise RuntimeError(f"Invalid XML in HERE batch response: {e}") from e
+    for element in root.iter():
+        if element.tag.rsplit('}', 1)[-1] == tag:
+            return element.text
+    raise RuntimeError(f"No {tag} in HERE batch response")
+
+async def prefetch_addresses(geocoder, coordinates, cache):
+    """
+    Reverse geocode all coordinates missing from the cache with one bulk geocoder and store the results,
+    so the per-row lookups only go to Nominatim for what the bulk job could not resolve.
+    
+    Parameters:
+    - geocoder: A BulkReverseGeocoder instance.
+    - coordinates: A list of (latitude, longitude) tuples.
+    - cache: A shelve mapping of rounded coordinates to addresses.
+    """
+    # Deduplicate by cache key so every rounded location is only sent once
+    missing = {}
+    for lat, lon in coordinates:
+        key = geocode_cache_key(lat, lon)
+        if key not in cache:
+            missing.setdefault(key, (lat, lon))
+    if not missing:
+        return
+    
+    try:
+        addresses = await asyncio.to_thread(geocoder.bulk_reverse, list(missing.values()))
+    except requests.RequestException as e:
+        # Request errors quote the URL, which carries the API key, so only report the type and status code
+        status = e.response.status_code if e.response is not None else 'no response'
+        print(f"Bulk geocoding failed ({type(e).__name__}, status {status}), falling back to Nominatim")
+        return
+    except RuntimeError as e:
+        # Leave everything to the Nominatim fallback
+        print(f"Bulk geocoding failed, falling back to Nominatim: {e}")
+        return
+    
+    for key, address in zip(missing, addresses):
+        if address is not None:
+            cache[key] = address
+
+async def open_reverse_geocoder(stack, max_workers=10):
+    """
+    Open a rate-limited reverse geocoder that stays open until the given exit stack closes.
+    Uses the asynchronous aiohttp adapter when aiohttp is installed, otherwise runs blocking
+    Nominatim requests on a thread pool, which still overlaps the time spent waiting on the network.
+    
+    Parameters:
+    - stack: The contextlib.AsyncExitStack owning the geolocator session or thread pool.
+    - max_workers: Number of threads used when falling back to blocking requests.
+    
+    Returns:
+    - Coroutine function taking coordinates and a timeout, returning a Location or None.
+    """
+    if AioHTTPAdapter.is_available:
+        # Initialize geolocator with a descriptive user-agent on an asynchronous HTTP session
+        geolocator = await stack.enter_async_context(
+            Nominatim(user_agent="your_application_name_here", adapter_factory=AioHTTPAdapter)
+        )
+        # The rate limiter spaces requests out, retries failures and returns None once retries run out
+        return AsyncRateLimiter(geolocator.reverse, swallow_exceptions=True, **RATE_LIMIT)
+    
+    # Without aiohttp, share one blocking geolocator and rate limiter between the worker threads
+    # The limiter is thread-safe, so Nominatim's 1 request per second policy holds across all workers
+    # The requests adapter keeps one session, so every lookup reuses its keep-alive connections
+    geolocator = Nominatim(user_agent="your_application_name_here", adapter_factory=RequestsAdapter)
+    reverse = RateLimiter(geolocator.reverse, swallow_exceptions=True, **RATE_LIMIT)
+    executor = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+    loop = asyncio.get_running_loop()
+    
+    async def reverse_in_thread(coordinates, timeout):
+        return await loop.run_in_executor(executor, functools.partial(reverse, coordinates, timeout=timeout))
+    
+    return reverse_in_thread
+
+async def process_csv(file_path, batch_size=100):
     """
     Process a CSV file containing location data, reverse geocode coordinates, 
     and create a map with markers for each location.
@@ -63,8 +303,12 @@ def process_csv(file_path, batch_size=100):
     - file_path: Path to the CSV file containing location data.
     - batch_size: Number of rows to process in each batch to avoid overwhelming the server.
     """
-    # Read the CSV file into a DataFrame
-    df = pd.read_csv(file_path)
+    # Read only the needed columns of the CSV file into a DataFrame, with their types given up front
+    df = pd.read_csv(
+        file_path,
+        usecols=['name', 'latitude', 'longitude'],
+        dtype={'name': 'string', 'latitude': 'float64', 'longitude': 'float64'}
+    )
     
     # Print column names for debugging purposes
     print("Columns in the CSV file:", df.columns.tolist())
@@ -73,45 +317,63 @@ def process_csv(file_path, batch_size=100):
     print("First few rows of the DataFrame:")
     print(df.head())
     
-    # Initialize geolocator with a descriptive user-agent
-    geolocator = Nominatim(user_agent="your_application_name_here")
-    
-    # Create a map object
+    # Create a map object and a feature group collecting the markers, attached to the map once at the end
     map_obj = create_map()
+    feature_group = folium.FeatureGroup(name='crocs')
+    
+    # Pull the columns out as NumPy arrays once instead of building a Series per row
+    names = df['name'].to_numpy()
+    latitudes = df['latitude'].to_numpy()
+    longitudes = df['longitude'].to_numpy()
     
-    # Process data in batches to avoid overwhelming the geocoding service
-    for start in range(0, len(df), batch_size):
-        end = min(start + batch_size, len(df))
-        batch_df = df.iloc[start:end]
+    # Open the address cache and the reverse geocoder for the duration of the run
+    async with contextlib.AsyncExitStack() as stack:
+        cache = stack.enter_context(shelve.open(GEOCODE_CACHE_FILE))
+        reverse = await open_reverse_geocoder(stack)
         
-        # Process each row in the batch
-        for index, row in batch_df.iterrows():
-            try:
-                # Convert 'name' column to string to avoid potential errors
-                name = str(row['name'])
-                lat = row['latitude']
-                lon = row['longitude']
-                
-                # Get address from latitude and longitude with retry mechanism
-                location = reverse_geocode_with_retry(geolocator, (lat, lon))
-                address = location.address if location else "Address not found"
+        # Resolve everything in one bulk job up front when a HERE API key is configured
+        api_key = os.environ.get(HERE_API_KEY_ENV)
+        if api_key:
+            await prefetch_addresses(HereBatchReverse(api_key), list(zip(latitudes, longitudes)), cache)
+        
+        # Process data in batches, issuing the requests of each batch concurrently
+        for start in range(0, len(df), batch_size):
+            end = min(start + batch_size, len(df))
+            coordinates = list(zip(latitudes[start:end], longitudes[start:end]))
+            
+            # Deduplicate by cache key so rows sharing a rounded location trigger a single lookup
+            unique_coordinates = {}
+            for coords in coordinates:
+                unique_coordinates.setdefault(geocode_cache_key(*coords), coords)
+            
+            # Get addresses for every rounded location in the batch, from the cache where possible
+            found = await asyncio.gather(
+                *(reverse_geocode_cached(reverse, coords, cache) for coords in unique_coordinates.values())
+            )
+            addresses = dict(zip(unique_coordinates, found))
+            
+            for name, (lat, lon) in zip(names[start:end], coordinates):
+                address = addresses[geocode_cache_key(lat, lon)] or "Address not found"
                 
                 # Add a marker to the map for this location
-                add_marker_to_map(map_obj, lat, lon, address)
+                add_marker_to_map(feature_group, lat, lon, address)
                 
                 print(f"Marker for {name} added to the map")
-            except KeyError as e:
-                # Handle cases where expected columns are missing
-                print(f"Column not found: {e}")
-        
-        # Optional: sleep between batches to avoid hitting rate limits of the geocoding service
-        time.sleep(2)
+    
+    # Attach all markers to the map in one go
+    map_obj.add_child(feature_group)
     
     # Save the final map to an HTML file
     output_file = 'combined_map.html'
-    map_obj.save(output_file)
+    save_map(map_obj, output_file)
     print(f"Combined map saved as {output_file}")
 
-# Example usage
-csv_file_path = 'locations.csv'
-process_csv(csv_file_path)
+async def main():
+    """
+    Build the combined map for the example locations file.
+    """
+    csv_file_path = 'locations.csv'
+    await process_csv(csv_file_path)
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -1,5 +1,36 @@
+import gzip  # Import gzip for writing a compressed copy of the map
+import numpy as np  # Import numpy for vectorized array operations
 import pandas as pd  # Import pandas for data manipulation
 import folium  # Import folium for creating interactive maps
+from folium.plugins import FastMarkerCluster  # Import FastMarkerCluster for rendering markers in the browser
+
+# JavaScript callback building a marker from a [latitude, longitude, zone, total captures, color] row
+# The two icons are created once in the enclosing function and shared by every marker,
+# using the same 'info-sign' glyph as folium.Icon
+MARKER_CALLBACK = """
+(function () {
+    var icons = {
+        red: L.AwesomeMarkers.icon({icon: 'info-sign', markerColor: 'red'}),
+        blue: L.AwesomeMarkers.icon({icon: 'info-sign', markerColor: 'blue'})
+    };
+    return function (row) {
+        var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icons[row[4]]});
+        marker.bindPopup('Zone: ' + row[2] + '<br>Total Captures: ' + row[3]);
+        return marker;
+    };
+})()
+"""
+
+# Function to save the map
+def save_map(map_obj, output_file):
+    """
+    Save the map as an HTML file plus a '.gz' compressed copy for hosting.
+    """
+    html = map_obj.get_root().render()  # Render the map to HTML once
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(html)  # Write the plain HTML for local use
+    with gzip.open(output_file + '.gz', 'wt', encoding='utf-8') as f:
+        f.write(html)  # Write the compressed HTML for hosting
 
 # Function to create the map with markers
 def create_map(data_df, coordinates_df, output_file='crocodile_capture_map.html'):
@@ -21,54 +52,65 @@ def create_map(data_df, coordinates_df, output_file='crocodile_capture_map.html'
     # Print columns in merged DataFrame for debugging purposes
     print("Columns in merged DataFrame:", merged_df.columns.tolist())  # Display column names for verification
 
-    # Add markers to the map for each zone
-    for _, row in merged_df.iterrows():  # Iterate over each row in the merged DataFrame
-        try:
-            zone_name = row['ZONE_NAME']  # Extract the zone name
-            total_captures = row['YEAR_TOTAL']  # Extract the total captures for the zone
-            latitude = row['LATITUDE']  # Extract the latitude for the zone
-            longitude = row['LONGITUDE']  # Extract the longitude for the zone
-
-            # Add a marker to the map with a popup showing zone and total captures
-            folium.Marker(
-                location=[latitude, longitude],  # Set marker location
-                popup=f"Zone: {zone_name}<br>Total Captures: {total_captures}",  # Popup text
-                icon=folium.Icon(color='red' if total_captures > 50 else 'blue')  # Set marker color based on capture count
-            ).add_to(map_obj)  # Add the marker to the map
-        except KeyError as e:
-            print(f"Missing key: {e}")  # Handle the case where expected columns are missing
+    # Add markers to the map for each zone, passing the rows as one array rendered by the browser
+    try:
+        zones = merged_df['ZONE_NAME'].to_numpy()  # Extract the zone names
+        totals = merged_df['YEAR_TOTAL'].to_numpy()  # Extract the total captures for each zone
+        latitudes = merged_df['LATITUDE'].to_numpy()  # Extract the latitudes
+        longitudes = merged_df['LONGITUDE'].to_numpy()  # Extract the longitudes
+        colors = np.where(totals > 50, 'red', 'blue')  # Set marker color based on capture count
+
+        # Zip the arrays into [latitude, longitude, zone, total captures, color] rows of plain Python values
+        data = list(zip(latitudes.tolist(), longitudes.tolist(), zones.tolist(), totals.tolist(), colors.tolist()))
+        FastMarkerCluster(data=data, callback=MARKER_CALLBACK).add_to(map_obj)  # Add the clustered markers to the map
+    except KeyError as e:
+        print(f"Missing key: {e}")  # Handle the case where expected columns are missing
 
     # Save the map as an HTML file
-    map_obj.save(output_file)  # Save the map to the specified HTML file
+    save_map(map_obj, output_file)  # Save the map to the specified HTML file and a compressed copy
     print(f"Map with crocodile capture zones saved as {output_file}.")  # Confirm saving
 
-# Load capture data from CSV file
-capture_data_file = 'crocodile_capture_data.csv'  # Define the path to the CSV file containing capture data
-data_df = pd.read_csv(capture_data_file)  # Read the CSV file into a DataFrame
+# Function to load the capture data and create the map
+def main():
+    """
+    Load the crocodile capture data, count captures per zone and save the capture map.
+    """
+    # Load capture data from CSV file
+    capture_data_file = 'crocodile_capture_data.csv'  # Define the path to the CSV file containing capture data
+    data_df = pd.read_csv(
+        capture_data_file,
+        usecols=['ZONE_NAME', 'DATE_CAPTURED'],  # Read only the columns used for the map
+        parse_dates=['DATE_CAPTURED'],  # Parse 'DATE_CAPTURED' to datetime while reading
+        date_format='%m/%d/%Y'  # Dates are month/day/year, so no format needs to be inferred
+    )  # Read the CSV file into a DataFrame
 
-# Print column names for debugging purposes
-print("Columns in the CSV file:", data_df.columns.tolist())  # Display column names to verify data structure
+    # Print column names for debugging purposes
+    print("Columns in the CSV file:", data_df.columns.tolist())  # Display column names to verify data structure
 
-# Convert 'DATE_CAPTURED' column to datetime format
-data_df['DATE_CAPTURED'] = pd.to_datetime(data_df['DATE_CAPTURED'])  # Ensure 'DATE_CAPTURED' is in datetime format
+    # Extract year from 'DATE_CAPTURED'
+    data_df['YEAR'] = data_df['DATE_CAPTURED'].dt.year  # Create a new column 'YEAR' from 'DATE_CAPTURED'
 
-# Extract year from 'DATE_CAPTURED'
-data_df['YEAR'] = data_df['DATE_CAPTURED'].dt.year  # Create a new column 'YEAR' from 'DATE_CAPTURED'
+    # Count captures per zone and broadcast the total back onto every row of that zone
+    zone_codes, zone_names = pd.factorize(data_df['ZONE_NAME'])  # Integer code per zone, -1 where the zone is missing
+    has_zone = zone_codes >= 0  # Mask of rows with a zone
+    zone_totals = np.bincount(zone_codes[has_zone], minlength=len(zone_names))  # Total captures for each zone
+    year_totals = np.zeros(len(zone_codes), dtype=zone_totals.dtype)  # Rows without a zone keep a total of 0
+    year_totals[has_zone] = zone_totals[zone_codes[has_zone]]  # Look up each row's zone total
+    data_df['YEAR_TOTAL'] = year_totals  # Store the zone totals as a new column 'YEAR_TOTAL'
 
-# Group by year and zone to count captures, then sum up to get total captures per zone
-yearly_totals = data_df.groupby(['YEAR', 'ZONE_NAME']).size().unstack(fill_value=0)  # Count captures per year and zone
-data_df['YEAR_TOTAL'] = yearly_totals.sum(axis=1).reindex(data_df['ZONE_NAME']).values  # Sum totals for each zone
+    # Define coordinates for each zone
+    coordinates_data = {
+        'ZONE_NAME': ['Borroloola', 'Katherine Zone', 'Litchfield', 'Lower Harbour', 'Management Zone',
+                      'Nhulunbuy', 'Outside Management Zone', 'Shoal Bay', 'Upper Harbour'],  # List of zone names
+        'LATITUDE': [-17.7414, -14.4846, -13.0876, -12.4634, -12.4640, -12.6461, -12.8000, -12.8456, -12.9000],  # Latitudes
+        'LONGITUDE': [139.3268, 132.4603, 130.9075, 130.8456, 130.8460, 136.8121, 136.8700, 131.3870, 131.4000]  # Longitudes
+    }
 
-# Define coordinates for each zone
-coordinates_data = {
-    'ZONE_NAME': ['Borroloola', 'Katherine Zone', 'Litchfield', 'Lower Harbour', 'Management Zone',
-                  'Nhulunbuy', 'Outside Management Zone', 'Shoal Bay', 'Upper Harbour'],  # List of zone names
-    'LATITUDE': [-17.7414, -14.4846, -13.0876, -12.4634, -12.4640, -12.6461, -12.8000, -12.8456, -12.9000],  # Latitudes
-    'LONGITUDE': [139.3268, 132.4603, 130.9075, 130.8456, 130.8460, 136.8121, 136.8700, 131.3870, 131.4000]  # Longitudes
-}
+    # Convert coordinates data to DataFrame
+    coordinates_df = pd.DataFrame(coordinates_data)  # Create a DataFrame from the coordinates dictionary
 
-# Convert coordinates data to DataFrame
-coordinates_df = pd.DataFrame(coordinates_data)  # Create a DataFrame from the coordinates dictionary
+    # Create the map with the provided data
+    create_map(data_df, coordinates_df)  # Call the function to create the map and save it
 
-# Create the map with the provided data
-create_map(data_df, coordinates_df)  # Call the function to create the map and save it
+if __name__ == '__main__':
+    main()  # Only build the map when run as a script, not on import
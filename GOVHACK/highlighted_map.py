@@ -1,8 +1,41 @@
+import gzip  # Import gzip for writing a compressed copy of the map
 import pandas as pd  # Import pandas library for data manipulation
 import folium  # Import folium library for creating interactive maps
-from geopy.geocoders import Nominatim  # Import Nominatim for reverse geocoding
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable  # Import exceptions for handling geocoding errors
-import time  # Import time module for implementing delays
+from jinja2 import Template  # Import Template for the circle layer's script block
+
+# Leaflet options for the two circles drawn around every location, in drawing order
+CIRCLE_OPTIONS = [
+    "{radius: 200, color: 'red', fill: true, fillColor: 'red', fillOpacity: 0.3}",  # Light red circle of 200 meters
+    "{radius: 500, color: 'orange', fill: true, fillColor: 'orange', fillOpacity: 0.2}"  # Light orange circle of 500 meters
+]
+
+# Grid cell size in degrees used to thin out the locations. The kept location can sit anywhere in its cell,
+# so the whole cell diagonal must fit within the 500 m circle: a 0.003 degree cell is about 333 m wide,
+# giving a diagonal of about 470 m
+GRID_CELL_DEGREES = 0.003
+
+class CircleLayer(folium.MacroElement):
+    """
+    Map layer drawing the circles for every location from a single script block.
+    The locations are written once as a JSON array and a JavaScript loop draws
+    both circles for each of them, instead of one Leaflet call per circle.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = L.featureGroup().addTo({{ this._parent.get_name() }});
+            {{ this.locations|tojson }}.forEach(function (latlng) {
+                {%- for options in this.circle_options %}
+                L.circle(latlng, {{ options }}).addTo({{ this.get_name() }});
+                {%- endfor %}
+            });
+        {% endmacro %}
+    """)
+
+    def __init__(self):
+        super().__init__()
+        self._name = 'CircleLayer'
+        self.circle_options = CIRCLE_OPTIONS
+        self.locations = []  # (latitude, longitude) of every location to circle
 
 def create_map():
     """
@@ -11,73 +44,41 @@ def create_map():
     # Create a blank map object with the specified initial location and zoom level
     return folium.Map(location=[0, 0], zoom_start=2)  # Center map at (0, 0) with zoom level 2
 
-def add_circle_to_map(map_obj, lat, lon):
+def add_circle_to_map(circle_layer, lat, lon):
     """
-    Add circles to the map at the specified latitude and longitude.
+    Add circles to the circle layer at the specified latitude and longitude.
     
     Parameters:
-    - map_obj: The folium map object to which circles will be added.
+    - circle_layer: The CircleLayer to which circles will be added.
     - lat: Latitude of the location to add the circle.
     - lon: Longitude of the location to add the circle.
     """
-    # Add a light red circle with a radius of 200 meters
-    folium.Circle(
-        location=[lat, lon],  # Location of the circle
-        radius=200,  # Radius in meters
-        color='red',  # Border color of the circle
-        fill=True,  # Fill the circle with color
-        fill_color='red',  # Fill color of the circle
-        fill_opacity=0.3  # Opacity of the fill color
-    ).add_to(map_obj)  # Add the circle to the map
-
-    # Add a light orange circle with a radius of 500 meters
-    folium.Circle(
-        location=[lat, lon],  # Location of the circle
-        radius=500,  # Radius in meters
-        color='orange',  # Border color of the circle
-        fill=True,  # Fill the circle with color
-        fill_color='orange',  # Fill color of the circle
-        fill_opacity=0.2  # Opacity of the fill color
-    ).add_to(map_obj)  # Add the circle to the map
+    # Record the location; CircleLayer draws both of its rings when the map is rendered
+    circle_layer.locations.append((lat, lon))
 
-def reverse_geocode_with_retry(geolocator, coordinates, retries=3, timeout=10):
+def save_map(map_obj, output_file):
     """
-    Perform reverse geocoding with retry mechanism in case of errors.
-    
-    Parameters:
-    - geolocator: The geolocator object used for reverse geocoding.
-    - coordinates: A tuple containing latitude and longitude to reverse geocode.
-    - retries: Number of times to retry in case of failure.
-    - timeout: Timeout for each geocoding request.
-    
-    Returns:
-    - location: The location object containing address details or None if failed.
+    Save the map as an HTML file and as a gzip-compressed '.gz' copy.
     """
-    for attempt in range(retries):  # Retry up to 'retries' times
-        try:
-            # Attempt to get the location details
-            location = geolocator.reverse(coordinates, timeout=timeout)
-            return location  # Return the location details if successful
-        except GeocoderTimedOut:
-            # Handle timeout exception
-            print(f"Geocoding service timed out on attempt {attempt + 1}. Retrying...")
-            time.sleep(2 ** attempt)  # Wait before retrying (exponential backoff)
-        except GeocoderUnavailable as e:
-            # Handle geocoding service unavailability
-            print(f"Geocoding service is unavailable: {e}")
-            break  # Stop retrying if the service is unavailable
-    return None  # Return None if all retries fail
+    html = map_obj.get_root().render()  # Render the map to HTML once
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(html)  # Write the plain HTML for local use
+    with gzip.open(output_file + '.gz', 'wt', encoding='utf-8') as f:
+        f.write(html)  # Write the compressed HTML for hosting
 
-def process_csv(file_path, batch_size=100):
+def process_csv(file_path):
     """
     Process a CSV file to create a map with circles representing locations.
     
     Parameters:
     - file_path: Path to the CSV file containing location data.
-    - batch_size: Number of rows to process in each batch.
     """
-    # Read the CSV file into a DataFrame
-    df = pd.read_csv(file_path)
+    # Read only the needed columns of the CSV file into a DataFrame, with their types given up front
+    df = pd.read_csv(
+        file_path,
+        usecols=['name', 'latitude', 'longitude'],
+        dtype={'name': 'string', 'latitude': 'float64', 'longitude': 'float64'}
+    )
     
     # Print column names in the DataFrame for debugging purposes
     print("Columns in the CSV file:", df.columns.tolist())
@@ -86,52 +87,42 @@ def process_csv(file_path, batch_size=100):
     print("First few rows of the DataFrame:")
     print(df.head())
     
-    # Select every 5th row from the DataFrame to reduce the number of points
-    df_sampled = df.iloc[::5].reset_index(drop=True)  # Downsample the DataFrame by taking every 5th row
-    
-    # Initialize the geolocator with a descriptive user-agent
-    geolocator = Nominatim(user_agent="your_application_name_here")
+    # Keep the first row of each grid cell to reduce the number of points; any dropped row is at most
+    # one cell diagonal away from the kept row, so it still falls inside the kept row's 500 m circle
+    grid_cells = (df[['latitude', 'longitude']] / GRID_CELL_DEGREES).round()  # Snap each location to its grid cell
+    df_sampled = df[~grid_cells.duplicated()].reset_index(drop=True)  # Drop rows falling in an already covered cell
     
-    # Create a map object
+    # Create a map object and a layer collecting the circles, attached to the map once at the end
     map_obj = create_map()
+    circle_layer = CircleLayer()
     
-    # Process the data in batches to avoid overwhelming the geocoding service
-    for start in range(0, len(df_sampled), batch_size):
-        end = min(start + batch_size, len(df_sampled))  # Determine the end index for the current batch
-        batch_df = df_sampled.iloc[start:end]  # Get the current batch of data
-        
-        # Process each row in the current batch
-        for index, row in batch_df.iterrows():
-            try:
-                # Convert 'name' to string to avoid AttributeError
-                name = str(row['name'])
-                lat = row['latitude']  # Extract latitude
-                lon = row['longitude']  # Extract longitude
-                
-                # Get the address from latitude and longitude with retry mechanism
-                location = reverse_geocode_with_retry(geolocator, (lat, lon))
-                address = location.address if location else "Address not found"  # Get address or default message
-                
-                # Add two circles (200m light red and 500m light orange) to the map
-                add_circle_to_map(map_obj, lat, lon)
-                
-                # Print confirmation message
-                print(f"Circles for {name} added to the map")
-            except KeyError as e:
-                # Handle missing column errors
-                print(f"Column not found: {e}")
-            except IndexError as e:
-                # Handle index errors
-                print(f"Index error: {e}. Skipping this row.")
+    # Pull the columns out as NumPy arrays once instead of building a Series per row
+    names = df_sampled['name'].to_numpy()  # Extract names, read as strings to avoid AttributeError
+    latitudes = df_sampled['latitude'].to_numpy()  # Extract latitudes
+    longitudes = df_sampled['longitude'].to_numpy()  # Extract longitudes
+    
+    # Process each sampled row
+    for name, lat, lon in zip(names, latitudes, longitudes):
+        # Add two circles (200m light red and 500m light orange) to the map
+        add_circle_to_map(circle_layer, lat, lon)
         
-        # Optional: sleep between batches to avoid hitting rate limits
-        time.sleep(2)
+        # Print confirmation message
+        print(f"Circles for {name} added")
+    
+    # Attach all circles to the map in one go
+    map_obj.add_child(circle_layer)
     
     # Save the map to an HTML file
     output_file = 'highlighted_map.html'
-    map_obj.save(output_file)  # Save the created map to an HTML file
+    save_map(map_obj, output_file)  # Save the created map to an HTML file and a compressed copy
     print(f"Highlighted map saved as {output_file}")  # Print confirmation message
 
-# Example usage
-csv_file_path = 'locations.csv'  # Path to the CSV file containing location data
-process_csv(csv_file_path)  # Call the function to process the CSV file and create the map
+def main():
+    """
+    Build the highlighted map for the example locations file.
+    """
+    csv_file_path = 'locations.csv'  # Path to the CSV file containing location data
+    process_csv(csv_file_path)  # Call the function to process the CSV file and create the map
+
+if __name__ == '__main__':
+    main()  # Only build the map when run as a script, not on import